@@ -267,7 +267,7 @@ async function main() {
     }
 
     const final = [...newUnique, ...existing].sort((a, b) => b.date.localeCompare(a.date));
-    fs.writeFileSync(dayPath, JSON.stringify(final, null, 2), 'utf8');
+    fs.writeFileSync(dayPath, JSON.stringify(final), 'utf8');
     totalNew += newUnique.length;
     console.log(`  ✓ ${dateStr}.json — ${newUnique.length} new, ${final.length} total`);
   }
@@ -20,14 +20,18 @@ weread_scrape.py — 通过 weread.111965.xyz 中转平台抓取微信公众号
 """
 
 import os
-import json
 import time
+import asyncio
 import logging
 import hashlib
+from collections import defaultdict
+from collections.abc import Iterator
 from datetime import datetime, timezone, timedelta
 from pathlib import Path
 
-import requests
+import aiohttp
+import ciso8601
+import orjson
 
 # ═══════════════════════════════════════════════════════════
 # 中转平台配置
@@ -58,6 +62,15 @@ MP_LIST = [
 
 RECENT_DAYS = 7
 
+# 并发抓取：同时在途的公众号请求数上限 / 对中转平台的连接数上限
+MAX_CONCURRENCY   = 8
+MAX_CONN_PER_HOST = 4
+
+# HTTP 响应缓存有效期（秒）：有效期内直接复用，过期后走条件请求（ETag / Last-Modified）
+# 缓存文件 out/http_cache.json 已 gitignore，只对同一台机器上的重复运行生效
+# （本地调试、短时间内多次手动运行）；CI 每次全新 checkout，不会命中缓存。
+HTTP_CACHE_TTL = 30 * 60
+
 # ═══════════════════════════════════════════════════════════
 # 输出路径
 # ═══════════════════════════════════════════════════════════
@@ -67,6 +80,8 @@ SUBS_FILE          = OUT_DIR / "subscriptions.json"
 ARTICLES_FILE      = OUT_DIR / "articles.json"
 DAILY_FILE         = OUT_DIR / "daily.md"
 STATE_FILE         = OUT_DIR / "state.json"
+HTTP_CACHE_FILE    = OUT_DIR / "http_cache.json"
+SEEN_UIDS_FILE     = OUT_DIR / "seen_uids.json"
 
 # 前端按日期读取的文章目录（每天一个 YYYY-MM-DD.json 文件）
 DATA_DIR = Path(__file__).parent.parent / "data"
@@ -96,55 +111,107 @@ def build_headers(vid: str, token: str) -> dict:
     }
 
 
-def get_json(url: str, headers: dict, retries: int = 2, backoff: float = 2.0) -> list | dict:
+async def get_json(session: aiohttp.ClientSession, url: str,
+                   cache: dict | None = None,
+                   retries: int = 2, backoff: float = 2.0) -> list | dict:
+    """GET 并解析 JSON（鉴权头已挂在 session 上）。
+
+    传入 cache 时：TTL 内直接命中，过期则发条件请求，304 复用缓存。
+    只有内容或校验头变化时才替换 cache[url]（新对象），否则原地刷新 ts，
+    调用方据此判断是否需要写回缓存文件。
+    """
+    entry = cache.get(url) if cache is not None else None
+    if entry and time.time() - entry["ts"] < HTTP_CACHE_TTL:
+        return entry["body"]
+    headers: dict = {}
+    if entry:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
     last_err: Exception | None = None
     for attempt in range(retries + 1):
         try:
-            resp = requests.get(url, headers=headers, timeout=20)
-            if resp.status_code in (401, 403):
-                log.error("❌ HTTP %d — %s", resp.status_code, resp.text[:200])
-                raise RuntimeError(f"auth_error:{resp.status_code}")
-            if resp.status_code >= 500:
-                wait = backoff ** attempt
-                log.warning("HTTP %d，%.0fs 后重试…", resp.status_code, wait)
-                time.sleep(wait)
-                continue
-            resp.raise_for_status()
-            return resp.json()
+            async with session.get(url, headers=headers,
+                                   timeout=aiohttp.ClientTimeout(total=20)) as resp:
+                if resp.status in (401, 403):
+                    log.error("❌ HTTP %d — %s", resp.status, (await resp.text())[:200])
+                    raise RuntimeError(f"auth_error:{resp.status}")
+                if resp.status == 304 and entry:
+                    entry["ts"] = time.time()
+                    return entry["body"]
+                if resp.status < 500:
+                    resp.raise_for_status()
+                    body = await resp.json(content_type=None)
+                    if cache is not None:
+                        etag          = resp.headers.get("ETag", "")
+                        last_modified = resp.headers.get("Last-Modified", "")
+                        if (entry and entry["body"] == body and entry.get("etag") == etag
+                                and entry.get("last_modified") == last_modified):
+                            entry["ts"] = time.time()
+                        else:
+                            cache[url] = {
+                                "etag":          etag,
+                                "last_modified": last_modified,
+                                "ts":            time.time(),
+                                "body":          body,
+                            }
+                    return body
+            # 5xx：先释放连接再退避，避免占着连接池睡眠
+            wait = backoff ** attempt
+            log.warning("HTTP %d，%.0fs 后重试…", resp.status, wait)
+            await asyncio.sleep(wait)
         except RuntimeError:
             raise
-        except requests.exceptions.Timeout as e:
+        except asyncio.TimeoutError as e:
             last_err = e
-            time.sleep(backoff ** attempt)
+            await asyncio.sleep(backoff ** attempt)
         except Exception as e:
             last_err = e
             if attempt < retries:
-                time.sleep(backoff ** attempt)
+                await asyncio.sleep(backoff ** attempt)
     raise RuntimeError(f"请求失败（已重试 {retries + 1} 次）：{last_err}")
 
 
+# ═══════════════════════════════════════════════════════════
+# 文件工具
+# ═══════════════════════════════════════════════════════════
+
+def atomic_write_bytes(path: Path, data: bytes) -> None:
+    """先写临时文件再 os.replace：中途崩溃也不会留下半截文件，读者只会看到旧版或新版。"""
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
 # ═══════════════════════════════════════════════════════════
 # A. 抓取单个公众号文章列表
 # ═══════════════════════════════════════════════════════════
 
 def _parse_pub_time(raw) -> datetime:
+    """统一为秒级 UTC 时间：isoformat() 恒为 YYYY-MM-DDTHH:MM:SS+00:00，可直接按字符串比较。"""
     if isinstance(raw, (int, float)) and raw > 1_000_000_000:
-        return datetime.fromtimestamp(raw, tz=timezone.utc)
+        return datetime.fromtimestamp(int(raw), tz=timezone.utc)
     if isinstance(raw, str) and raw:
         try:
-            return datetime.fromisoformat(raw.replace("Z", "+00:00"))
+            dt = ciso8601.parse_datetime(raw)
         except ValueError:
             pass
-    return datetime.now(timezone.utc)
+        else:
+            if dt.tzinfo is None:
+                dt = dt.replace(tzinfo=timezone.utc)
+            return dt.astimezone(timezone.utc).replace(microsecond=0)
+    return datetime.now(timezone.utc).replace(microsecond=0)
 
 
-def fetch_articles_for_mp(mp: dict, headers: dict) -> list[dict]:
+async def fetch_articles_for_mp(session: aiohttp.ClientSession, mp: dict, cache: dict) -> list[dict]:
     mp_id  = mp["id"]
     mp_name = mp["name"]
     url = RELAY_ARTICLES_URL.format(mp_id=mp_id)
 
     try:
-        data = get_json(url, headers)
+        data = await get_json(session, url, cache)
     except RuntimeError as e:
         if "auth_error" in str(e):
             raise
@@ -159,30 +226,36 @@ def fetch_articles_for_mp(mp: dict, headers: dict) -> list[dict]:
         log.info("  [%s] 暂无文章（可能尚未同步）", mp_name)
         return []
 
-    articles = []
-    for item in data:
+    articles = list(_iter_articles(mp, data))
+    log.info("  [%s] 抓到 %d 篇", mp_name, len(articles))
+    return articles
+
+
+def _iter_articles(mp: dict, items: list) -> Iterator[dict]:
+    """逐条产出规范化后的文章，跳过无标题条目。"""
+    mp_id   = mp["id"]
+    mp_name = mp["name"]
+    for item in items:
         title = item.get("title", "").strip()
         if not title:
             continue
-        pub_dt = _parse_pub_time(item.get("publishTime", 0))
-        articles.append({
+        pub_time = _parse_pub_time(item.get("publishTime", 0)).isoformat()
+        yield {
             "account_name": mp_name,
             "account_id":   mp_id,
             "title":        title,
             "url":          item.get("url", ""),
             "pic_url":      item.get("picUrl", ""),
-            "publish_time": pub_dt.isoformat(),
+            "publish_time": pub_time,
             "summary":      "",
-            "_uid":         _uid(mp_id, title, pub_dt.isoformat()),
-        })
-
-    log.info("  [%s] 抓到 %d 篇", mp_name, len(articles))
-    return articles
+            "_uid":         _uid(mp_id, title, pub_time),
+        }
 
 
 def _uid(account_id: str, title: str, pub_time: str) -> str:
     raw = f"{account_id}|{title}|{pub_time[:10]}"
-    return hashlib.sha1(raw.encode()).hexdigest()[:12]
+    # 6 字节 = 12 位十六进制，与原 sha1 截断长度一致
+    return hashlib.blake2b(raw.encode(), digest_size=6).hexdigest()
 
 
 # ═══════════════════════════════════════════════════════════
@@ -192,17 +265,49 @@ def _uid(account_id: str, title: str, pub_time: str) -> str:
 def load_state() -> dict:
     if STATE_FILE.exists():
         try:
-            return json.loads(STATE_FILE.read_text(encoding="utf-8"))
+            return orjson.loads(STATE_FILE.read_bytes())
         except Exception:
             pass
     return {}
 
 
 def save_state(state: dict) -> None:
-    STATE_FILE.write_text(
-        json.dumps(state, ensure_ascii=False, indent=2),
-        encoding="utf-8",
-    )
+    atomic_write_bytes(STATE_FILE, orjson.dumps(state))
+
+
+def load_http_cache() -> dict:
+    if HTTP_CACHE_FILE.exists():
+        try:
+            return orjson.loads(HTTP_CACHE_FILE.read_bytes())
+        except Exception:
+            pass
+    return {}
+
+
+def save_http_cache(cache: dict) -> None:
+    atomic_write_bytes(HTTP_CACHE_FILE, orjson.dumps(cache))
+
+
+def load_seen_uids() -> dict[str, str]:
+    """已合并进 data/ 的文章 {_uid: 北京日期}，命中即可跳过读取对应日期文件。
+
+    注意：手动删除或重建某天的 data/YYYY-MM-DD.json 时，需同时删除
+    out/seen_uids.json（或其中对应日期的条目），否则这些文章不会被重新合并。
+    """
+    if SEEN_UIDS_FILE.exists():
+        try:
+            data = orjson.loads(SEEN_UIDS_FILE.read_bytes())
+            if isinstance(data, dict):
+                return data
+        except Exception:
+            pass
+    return {}
+
+
+def save_seen_uids(seen: dict[str, str], min_date: str) -> None:
+    """只保留 min_date 及之后的条目：更早日期已在抓取窗口之外，不会再出现。"""
+    kept = {uid: d for uid, d in seen.items() if d >= min_date}
+    atomic_write_bytes(SEEN_UIDS_FILE, orjson.dumps(kept))
 
 
 # ═══════════════════════════════════════════════════════════
@@ -210,10 +315,9 @@ def save_state(state: dict) -> None:
 # ═══════════════════════════════════════════════════════════
 
 def _to_frontend_format(article: dict) -> dict:
-    pub_dt = datetime.fromisoformat(article["publish_time"])
-    if pub_dt.tzinfo is None:
-        pub_dt = pub_dt.replace(tzinfo=timezone.utc)
-    beijing_date = (pub_dt + timedelta(hours=8)).strftime("%Y-%m-%d")
+    # publish_time 已统一为 UTC（见 _parse_pub_time），+8h 后直接取日期，不走 strftime
+    pub_dt = ciso8601.parse_datetime(article["publish_time"])
+    beijing_date = (pub_dt + timedelta(hours=8)).date().isoformat()
     return {
         "id":         article["_uid"],
         "date":       beijing_date,
@@ -229,9 +333,13 @@ def _to_frontend_format(article: dict) -> dict:
 
 def merge_into_data_files(weread_articles: list[dict]) -> None:
     """将 WeRead 文章按日期写入 data/YYYY-MM-DD.json，与 RSS 文章合并。"""
-    # 按北京日期分组
+    seen = load_seen_uids()
+
+    # 按北京日期分组；已合并过的 _uid 直接跳过，只有未命中的日期才去读文件
     by_date: dict[str, list] = {}
     for a in weread_articles:
+        if a["_uid"] in seen:
+            continue
         fe = _to_frontend_format(a)
         by_date.setdefault(fe["date"], []).append(fe)
 
@@ -249,23 +357,34 @@ def merge_into_data_files(weread_articles: list[dict]) -> None:
         existing: list[dict] = []
         if day_file.exists():
             try:
-                existing = json.loads(day_file.read_text(encoding="utf-8"))
+                existing = orjson.loads(day_file.read_bytes())
             except Exception:
                 pass
 
+        # 已有条目原样保留（RSS 可能有同 URL / 无 URL 条目），URL 集合只用于判重
         existing_urls = {a.get("url", "") for a in existing}
-        new_entries = [a for a in articles if a.get("url") and a["url"] not in existing_urls]
+        new_entries: list[dict] = []
+        for a in articles:
+            if a["url"] and a["url"] not in existing_urls:
+                existing_urls.add(a["url"])
+                new_entries.append(a)
+        # 无 URL 的条目没有写入，不能记为已合并：中转平台补上 URL 后还要再合并
+        seen.update((a["id"], date_str) for a in articles if a["url"])
 
         if not new_entries:
             continue
 
         merged = existing + new_entries
         merged.sort(key=lambda x: x.get("date", ""), reverse=True)
-        day_file.write_text(json.dumps(merged, ensure_ascii=False, indent=2), encoding="utf-8")
+        atomic_write_bytes(day_file, orjson.dumps(merged))
         total_new += len(new_entries)
         log.info("→ data/%s.json：新增 %d 篇 WeChat（共 %d 篇）",
                  date_str, len(new_entries), len(merged))
 
+    # 抓取窗口（RECENT_DAYS）起点对应的北京日期，更早的 _uid 可以丢弃
+    cutoff   = datetime.now(timezone.utc) - timedelta(days=RECENT_DAYS)
+    min_date = (cutoff + timedelta(hours=8)).date().isoformat()
+    save_seen_uids(seen, min_date)
     log.info("→ 共更新 %d 天文件，新增 %d 篇 WeChat 文章", len(by_date), total_new)
 
 
@@ -284,7 +403,7 @@ def send_to_downstream(articles: list[dict]) -> None:
 # 主流程
 # ═══════════════════════════════════════════════════════════
 
-def run() -> None:
+async def run() -> None:
     vid   = os.environ.get("WEREAD_VID", "").strip()
     token = os.environ.get("WEREAD_TOKEN", "").strip()
     if not vid or not token:
@@ -296,54 +415,66 @@ def run() -> None:
         )
 
     OUT_DIR.mkdir(parents=True, exist_ok=True)
-    headers  = build_headers(vid, token)
     state    = load_state()
-    cutoff   = datetime.now(timezone.utc) - timedelta(days=RECENT_DAYS)
+    cache    = load_http_cache()
+    cache_before = dict(cache)
+    cutoff   = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(days=RECENT_DAYS)
+    # publish_time 已统一为 UTC ISO 字符串，字典序即时间序，直接与 cutoff_iso 比较
+    cutoff_iso = cutoff.isoformat()
     today_cn = datetime.now(timezone(timedelta(hours=8))).strftime("%Y-%m-%d")
 
     # ── Step 1：保存订阅列表 ──
     log.info("━━━ Step 1: 保存订阅列表 ━━━")
-    SUBS_FILE.write_text(
-        json.dumps(MP_LIST, ensure_ascii=False, indent=2),
-        encoding="utf-8",
-    )
+    atomic_write_bytes(SUBS_FILE, orjson.dumps(MP_LIST))
     log.info("→ %s (%d 个公众号)", SUBS_FILE, len(MP_LIST))
 
     # ── Step 2：文章抓取 ──
     log.info("━━━ Step 2: 抓取文章 ━━━")
-    all_articles: list[dict] = []
-    seen_uids:    set[str]   = set()
-
-    for mp in MP_LIST:
-        articles = fetch_articles_for_mp(mp, headers)
-
-        for a in articles:
-            uid = a["_uid"]
-            if uid in seen_uids:
-                continue
-            try:
-                pub_dt = datetime.fromisoformat(a["publish_time"])
-            except ValueError:
-                continue
-            if pub_dt.tzinfo is None:
-                pub_dt = pub_dt.replace(tzinfo=timezone.utc)
-            if pub_dt < cutoff:
-                continue
-            seen_uids.add(uid)
-            all_articles.append(a)
+    seen_uids: set[str] = set()
+
+    # 所有公众号并发抓取，信号量限流（替代逐个请求 + sleep）
+    sem = asyncio.Semaphore(MAX_CONCURRENCY)
+
+    async def bounded_fetch(session: aiohttp.ClientSession, mp: dict) -> list[dict]:
+        async with sem:
+            return await fetch_articles_for_mp(session, mp, cache)
+
+    connector = aiohttp.TCPConnector(limit_per_host=MAX_CONN_PER_HOST)
+    # 单个 session：鉴权头只设一次，连接池 keep-alive 复用 TLS 连接
+    async with aiohttp.ClientSession(headers=build_headers(vid, token),
+                                     connector=connector) as session:
+        results = await asyncio.gather(*(bounded_fetch(session, mp) for mp in MP_LIST))
+    # 仅当有条目被新增或替换时写回（304 / 内容相同只刷新内存中的 ts）
+    if any(entry is not cache_before.get(url) for url, entry in cache.items()):
+        save_http_cache(cache)
+
+    # 时间窗口过滤 + 按 _uid 去重（set.add 返回 None，首次出现时条件为真）
+    all_articles: list[dict] = [
+        a for articles in results for a in articles
+        if a["publish_time"] >= cutoff_iso
+        and a["_uid"] not in seen_uids and not seen_uids.add(a["_uid"])
+    ]
 
+    state_changed = False
+    for mp, articles in zip(MP_LIST, results):
         if articles:
             latest = max(a["publish_time"] for a in articles)
             if not state.get(mp["id"]) or latest > state[mp["id"]]:
                 state[mp["id"]] = latest
-
-        time.sleep(0.5)
+                state_changed = True
 
     all_articles.sort(key=lambda x: x["publish_time"], reverse=True)
-    ARTICLES_FILE.write_text(
-        json.dumps(all_articles, ensure_ascii=False, indent=2),
-        encoding="utf-8",
-    )
+
+    # 输出内容与上次运行一致（含 today_cn，daily.md 随日期变化）则跳过后续写出；
+    # 哈希整篇文章而非 _uid，url / pic_url / publish_time 的更新也会触发重写
+    run_hash = hashlib.blake2b(orjson.dumps([today_cn, all_articles])).hexdigest()
+    if run_hash == state.get("_last_hash"):
+        if state_changed:
+            save_state(state)
+        log.info("✅ 无变化（%d 篇文章与上次一致），跳过写出", len(all_articles))
+        return
+
+    atomic_write_bytes(ARTICLES_FILE, orjson.dumps(all_articles))
     log.info("→ %s (%d 篇近 %d 天文章)", ARTICLES_FILE, len(all_articles), RECENT_DAYS)
 
     # ── Step 3：生成 daily.md ──
@@ -353,15 +484,16 @@ def run() -> None:
         f"# 每日 AI 公众号速报 — {today_cn}", "",
         f"> 共 {len(today_articles)} 篇新文章（来自微信读书订阅）", "",
     ]
-    by_account: dict[str, list] = {}
+    by_account: defaultdict[str, list] = defaultdict(list)
     for a in today_articles:
-        by_account.setdefault(a["account_name"], []).append(a)
+        by_account[a["account_name"]].append(a)
     for acc, arts in sorted(by_account.items()):
-        lines.append(f"## {acc}\n")
-        for a in arts:
-            lines.append(f"- [{a['title']}]({a['url'] or '#'})")
-        lines.append("")
-    DAILY_FILE.write_text("\n".join(lines), encoding="utf-8")
+        lines += (
+            f"## {acc}\n",
+            "\n".join(f"- [{a['title']}]({a['url'] or '#'})" for a in arts),
+            "",
+        )
+    atomic_write_bytes(DAILY_FILE, "\n".join(lines).encode("utf-8"))
     log.info("→ %s (%d 篇今日文章)", DAILY_FILE, len(today_articles))
 
     # ── Step 4：保存增量状态 ──
@@ -372,6 +504,10 @@ def run() -> None:
     log.info("━━━ Step 5: 合并到 data/YYYY-MM-DD.json ━━━")
     merge_into_data_files(all_articles)
 
+    # 全部写出（含 data/ 合并）成功后才记录本次哈希，中途失败时下次会完整重跑
+    state["_last_hash"] = run_hash
+    save_state(state)
+
     # ── Step 6：推送下游（预留） ──
     send_to_downstream(today_articles)
 
@@ -379,4 +515,4 @@ def run() -> None:
 
 
 if __name__ == "__main__":
-    run()
+    asyncio.run(run())
@@ -0,0 +1,72 @@
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+import orjson
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+import weread_scrape as ws  # noqa: E402
+
+MP = {"id": "MP_WXS_1", "name": "测试号"}
+
+
+def _relay_item(url: str) -> dict:
+    return {
+        "title":       "T1",
+        "url":         url,
+        "picUrl":      "",
+        "publishTime": int(datetime.now(timezone.utc).timestamp()) - 3600,
+    }
+
+
+@pytest.fixture
+def tmp_tree(tmp_path, monkeypatch):
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+    monkeypatch.setattr(ws, "OUT_DIR", out_dir)
+    monkeypatch.setattr(ws, "SUBS_FILE", out_dir / "subscriptions.json")
+    monkeypatch.setattr(ws, "ARTICLES_FILE", out_dir / "articles.json")
+    monkeypatch.setattr(ws, "DAILY_FILE", out_dir / "daily.md")
+    monkeypatch.setattr(ws, "STATE_FILE", out_dir / "state.json")
+    monkeypatch.setattr(ws, "HTTP_CACHE_FILE", out_dir / "http_cache.json")
+    monkeypatch.setattr(ws, "SEEN_UIDS_FILE", out_dir / "seen_uids.json")
+    monkeypatch.setattr(ws, "DATA_DIR", tmp_path / "data")
+    return tmp_path
+
+
+def _day_files(tmp_tree: Path) -> list[dict]:
+    entries: list[dict] = []
+    for f in sorted((tmp_tree / "data").glob("*.json")):
+        entries += orjson.loads(f.read_bytes())
+    return entries
+
+
+def test_merge_picks_up_url_filled_in_on_later_run(tmp_tree):
+    ws.merge_into_data_files(list(ws._iter_articles(MP, [_relay_item("")])))
+    assert _day_files(tmp_tree) == []
+
+    ws.merge_into_data_files(list(ws._iter_articles(MP, [_relay_item("https://mp/1")])))
+    assert [a["url"] for a in _day_files(tmp_tree)] == ["https://mp/1"]
+
+
+def test_run_rewrites_outputs_when_article_fields_change(tmp_tree, monkeypatch):
+    monkeypatch.setenv("WEREAD_VID", "1")
+    monkeypatch.setenv("WEREAD_TOKEN", "t")
+    monkeypatch.setattr(ws, "MP_LIST", [MP])
+    monkeypatch.setattr(ws, "send_to_downstream", lambda articles: None)
+
+    def serve(url: str) -> None:
+        async def fake_fetch(session, mp, cache):
+            return list(ws._iter_articles(mp, [_relay_item(url)]))
+        monkeypatch.setattr(ws, "fetch_articles_for_mp", fake_fetch)
+
+    serve("")
+    ws.asyncio.run(ws.run())
+    serve("https://mp/1")
+    ws.asyncio.run(ws.run())
+
+    articles = orjson.loads(ws.ARTICLES_FILE.read_bytes())
+    assert [a["url"] for a in articles] == ["https://mp/1"]
+    assert [a["url"] for a in _day_files(tmp_tree)] == ["https://mp/1"]